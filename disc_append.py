@@ -2,38 +2,46 @@
 
 from __future__ import annotations
 
-import argparse
-from collections.abc import Collection
+# Modules only needed on some paths (argparse and those used by the on-disk
+# cache) are imported inside the functions that use them, as importing them up
+# front would dominate the startup time of this script.
 import dataclasses
 from dataclasses import dataclass
 from enum import auto, Enum
+import functools
+import os
 from pathlib import Path
 import subprocess
-from typing import Optional, Union
+import sys
+import threading
+from typing import Optional
 import re
+import stat
 import time
 
-import humanfriendly
-
 
 class Command(Enum):
     INIT = auto()
     APPEND = auto()
 
     @classmethod
-    def list_command_options(cls) -> list[str]:
-        return [x.name.lower() for x in cls]
+    def list_command_options(cls) -> tuple[str, ...]:
+        return _COMMAND_OPTIONS
 
     @classmethod
     def from_command_option(cls, value: str) -> Command:
-        return cls[value.upper()]
+        return _COMMAND_BY_OPTION[value]
 
 
-@dataclass
+_COMMAND_BY_OPTION = {x.name.lower(): x for x in Command}
+_COMMAND_OPTIONS = tuple(_COMMAND_BY_OPTION)
+
+
+@dataclass(frozen=True, slots=True)
 class RunConfig:
     command: Command
     device: Path
-    source_paths: Collection[Path]
+    source_paths: tuple[Path, ...]
     speed: int
     dry_run: bool = False
     volume_id: Optional[str] = None
@@ -50,13 +58,15 @@ def main():
             if run_config.volume_id is None:
                 volume_id = get_volume_id(run_config.device)
                 print('Using volume id:', volume_id)
-                run_config.volume_id = volume_id
+                run_config = dataclasses.replace(run_config,
+                                                 volume_id=volume_id)
 
     print_confirmation_info(run_config)
 
     if not run_config.dry_run:
         if ask_confirmation():
             disc_write(run_config)
+            read_media_info.cache_clear()  # free space has changed
 
             time.sleep(30)  # wait for disk to be ejected and re-read
             media_info = read_media_info(run_config.device)
@@ -66,10 +76,32 @@ def main():
 
 
 def print_confirmation_info(run_config: RunConfig):
-    disc_write(dataclasses.replace(run_config, dry_run=True))
+    # mkisofs only reads the source paths, so it can run in the background.
+    # growisofs and dvd+rw-mediainfo both talk to the drive (growisofs opens
+    # it exclusively), so they must run one after the other. The thread is a
+    # daemon so that Ctrl-C doesn't wait for a long mkisofs run to finish.
+    write_size_result: dict[str, object] = {}
+
+    def compute_write_size():
+        try:
+            write_size_result['value'] = get_bytes_to_be_written(run_config)
+        except BaseException as e:
+            write_size_result['error'] = e
+
+    write_size_thread = threading.Thread(target=compute_write_size,
+                                         daemon=True)
+    write_size_thread.start()
+
+    disc_write_dry_run(run_config)
+    media_info = read_media_info(run_config.device)
+
+    write_size_thread.join()
+    if 'error' in write_size_result:
+        raise write_size_result['error']  # type: ignore
 
     print('')
-    print_size_approximations(run_config)
+    print_size_approximations(media_info,
+                              write_size_result['value'])  # type: ignore
 
     print_disc_write_error_messages(run_config)
 
@@ -83,33 +115,48 @@ def ask_confirmation() -> bool:
             return False
 
 
-def print_size_approximations(run_config: RunConfig):
-    media_info = read_media_info(run_config.device)
-
+def print_size_approximations(media_info: MediaInfo, approx_write_size: int):
     print_bytes_free(media_info)
-    approx_write_size = get_bytes_to_be_written(run_config)
     print(
         'Approx. '
-        f'{humanfriendly.format_size(approx_write_size, binary=True)} '
+        f'{format_size(approx_write_size)} '
         'to be written.'
     )
 
     size_left = media_info.free_size - approx_write_size
     print(
         'Approx.',
-        f'{humanfriendly.format_size(size_left, binary=True)}',
+        f'{format_size(size_left)}',
         'will be free after the operation.'
     )
 
 
 def print_bytes_free(media_info: MediaInfo):
     print(
-        f'{humanfriendly.format_size(media_info.free_size, binary=True)}',
+        f'{format_size(media_info.free_size)}',
         'bytes free on disc.'
     )
 
 
+SIZE_UNITS = ('KiB', 'MiB', 'GiB', 'TiB', 'PiB')
+
+
+def format_size(num_bytes: float) -> str:
+    """Format a byte count using binary units, e.g. `1.5 GiB`."""
+    if abs(num_bytes) < 1024:
+        return f'{num_bytes:.0f} bytes'
+
+    for unit in SIZE_UNITS:
+        num_bytes /= 1024
+        if abs(num_bytes) < 1024 or unit == SIZE_UNITS[-1]:
+            break
+
+    return f'{num_bytes:.2f}'.rstrip('0').rstrip('.') + f' {unit}'
+
+
 def parse_arguments() -> RunConfig:
+    import argparse
+
     parser = argparse.ArgumentParser(description='Modify a multi-session disc.')
     parser.add_argument('command', type=str,
                         choices=Command.list_command_options())
@@ -128,7 +175,7 @@ def parse_arguments() -> RunConfig:
     run_config = RunConfig(
         command=Command.from_command_option(args.command),
         device=args.device,
-        source_paths=args.source_paths,
+        source_paths=tuple(args.source_paths),
         dry_run=args.dry_run,
         volume_id=args.volume_id,
         speed=args.speed
@@ -146,11 +193,7 @@ def disc_write(run_config: RunConfig):
 
 
 def print_disc_write_error_messages(run_config: RunConfig):
-    completed_process = disc_write_impl(
-        dataclasses.replace(run_config, dry_run=True),
-        capture_output=True,
-        print_executing=False
-    )
+    completed_process = disc_write_dry_run(run_config)
     if 'already carries isofs' in completed_process.stderr:
         print('')
         print(
@@ -162,14 +205,22 @@ def print_disc_write_error_messages(run_config: RunConfig):
         )
 
 
-def disc_write_impl(run_config: RunConfig, capture_output=False,
-                    print_executing=True):
+@functools.lru_cache(maxsize=None)
+def disc_write_dry_run(run_config: RunConfig) -> subprocess.CompletedProcess:
+    # Memoized so the confirmation flow only spawns growisofs once.
+    return disc_write_impl(run_config, dry_run=True, capture_output=True,
+                           tee=True)
+
+
+def disc_write_impl(run_config: RunConfig, dry_run=False, capture_output=False,
+                    tee=False):
     if run_config.volume_id is None:
         raise ValueError("volume_id cannot be none.")
 
     session_flag = SESSION_FLAGS[run_config.command]
 
-    dry_run_flag = ['--dry-run'] if run_config.dry_run else []
+    dry_run = dry_run or run_config.dry_run
+    dry_run_flag = ['--dry-run'] if dry_run else []
 
     args = (
         ['growisofs']
@@ -180,38 +231,201 @@ def disc_write_impl(run_config: RunConfig, capture_output=False,
         + ['-V', run_config.volume_id]
         + [str(x) for x in run_config.source_paths]
     )
-    if print_executing:
-        print('Executing:', args)
+    print('Executing:', args)
+
+    if capture_output:
+        return run_captured(args, tee=tee)
+
+    return subprocess.run(args, check=True, text=True)
+
+
+def run_captured(args: list[str], tee=False) -> subprocess.CompletedProcess:
+    """Like `subprocess.run(args, capture_output=True, check=True)`.
+
+    If `tee` is set, each line is also echoed to our own stdout/stderr as
+    soon as it arrives instead of only being available after exit.
+    """
+    process = subprocess.Popen(args, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, text=True, bufsize=1)
+
+    stdout_lines: list[str] = []
+    stderr_lines: list[str] = []
+    readers = [
+        threading.Thread(target=_read_lines,
+                         args=(process.stdout, stdout_lines,
+                               sys.stdout if tee else None)),
+        threading.Thread(target=_read_lines,
+                         args=(process.stderr, stderr_lines,
+                               sys.stderr if tee else None)),
+    ]
+    for reader in readers:
+        reader.start()
+
+    returncode = process.wait()
+    for reader in readers:
+        reader.join()
+
+    stdout = ''.join(stdout_lines)
+    stderr = ''.join(stderr_lines)
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, args, stdout, stderr)
+
+    return subprocess.CompletedProcess(args, returncode, stdout, stderr)
+
+
+def run_helper(args: list[str]) -> subprocess.CompletedProcess:
+    """Run a short-lived helper tool and capture its output.
+
+    The arguments are chosen so CPython can start the child with
+    `posix_spawn` instead of forking the interpreter: the executable must be
+    given as a path and `close_fds` must be False (our own fds are
+    non-inheritable anyway). Don't add `preexec_fn`, `pass_fds`, `cwd` or
+    `shell=True` here, as any of them falls back to fork/exec.
+    """
+    executable = which(args[0]) or args[0]
+    return subprocess.run([executable] + args[1:], capture_output=True,
+                          check=True, text=True, close_fds=False)
+
+
+@functools.lru_cache(maxsize=None)
+def which(command: str) -> Optional[str]:
+    import shutil
+
+    return shutil.which(command)
+
 
-    return subprocess.run(args, capture_output=capture_output, check=True,
-                          text=True)
+def _read_lines(pipe, lines: list[str], echo_to):
+    with pipe:
+        for line in pipe:
+            lines.append(line)
+            if echo_to is not None:
+                echo_to.write(line)
+                echo_to.flush()
 
 
 def get_bytes_to_be_written(run_config: RunConfig) -> int:
+    # Only the latest fingerprint is kept for each set of source paths, as
+    # the trees are expected to change between runs.
+    cache_key = '\0'.join(os.path.abspath(x) for x in run_config.source_paths)
+    try:
+        fingerprint = fingerprint_source_paths(run_config.source_paths)
+    except OSError:
+        # The cache is optional. Skip it and let mkisofs deal with unreadable
+        # or vanishing files as it did before.
+        fingerprint = None
+
+    cache = read_cache(PRINT_SIZE_CACHE)
+    match cache.get(cache_key):
+        case [cached_fingerprint, cached_size] if (
+                fingerprint is not None
+                and cached_fingerprint == fingerprint):
+            return cached_size
+
     args = (
         ['mkisofs']
         + MKISOFS_BASE_ARGS
         + ['--print-size', '--quiet']
         + [str(x) for x in run_config.source_paths]
     )
-    completed_process = subprocess.run(
-        args,
-        capture_output=True, check=True, text=True
-    )
+    completed_process = run_helper(args)
 
     sectors_to_be_written = int(completed_process.stdout)
     bytes_to_be_written = sectors_to_be_written * 2048
 
+    if fingerprint is not None:
+        cache.pop(cache_key, None)  # re-insert as the most recent entry
+        cache[cache_key] = [fingerprint, bytes_to_be_written]
+        write_cache(PRINT_SIZE_CACHE, cache)
+
     return bytes_to_be_written
 
 
+def fingerprint_source_paths(source_paths: tuple[Path, ...]) -> str:
+    """Hash the metadata of every file under `source_paths`.
+
+    Any change to a file's size, mtime or inode, or to the set of files,
+    changes the fingerprint. This is much cheaper than `mkisofs --print-size`,
+    which has to walk the trees anyway.
+    """
+    import hashlib
+
+    fingerprint = hashlib.blake2b()
+    fingerprint.update(repr(MKISOFS_BASE_ARGS).encode())
+
+    # Depth-first walk with an explicit stack, so deep trees can't hit the
+    # recursion limit. Entries are visited in name order. Like mkisofs, follow
+    # symlinks given as source paths but not the ones found inside them.
+    stack = [(os.fspath(path), os.stat(path))
+             for path in reversed(source_paths)]
+    while stack:
+        path, path_stat = stack.pop()
+        fingerprint.update(
+            f'{path}\0{path_stat.st_mode}\0{path_stat.st_size}\0'
+            f'{path_stat.st_mtime_ns}\0{path_stat.st_ino}\n'
+            .encode(errors='surrogateescape')
+        )
+
+        if stat.S_ISDIR(path_stat.st_mode):
+            with os.scandir(path) as entries:
+                children = sorted(entries, key=lambda entry: entry.name,
+                                  reverse=True)
+            stack.extend((entry.path, entry.stat(follow_symlinks=False))
+                         for entry in children)
+
+    return fingerprint.hexdigest()
+
+
+PRINT_SIZE_CACHE = 'print_size.json'
+MAX_CACHE_ENTRIES = 32
+
+
+def get_cache_dir() -> Path:
+    cache_home = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(cache_home) / 'disc-append'
+
+
+def read_cache(name: str) -> dict:
+    import json
+
+    try:
+        with open(get_cache_dir() / name) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    return cache if isinstance(cache, dict) else {}
+
+
+def write_cache(name: str, cache: dict):
+    """Atomically replace the cache file. Failures are ignored.
+
+    Only the `MAX_CACHE_ENTRIES` most recently inserted keys are kept.
+    """
+    import json
+    import tempfile
+
+    for key in list(cache)[:-MAX_CACHE_ENTRIES]:
+        del cache[key]
+
+    cache_dir = get_cache_dir()
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=name)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(cache, f)
+            os.replace(tmp_path, cache_dir / name)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError:
+        pass
+
+
 def get_volume_id(device: Path) -> str:
-    args = ['blkid', '--output', 'value', '--match-tag', 'LABEL', '/dev/sr0']
+    args = ['blkid', '--output', 'value', '--match-tag', 'LABEL', str(device)]
 
-    completed_process = subprocess.run(
-        args,
-        capture_output=True, check=True, text=True
-    )
+    completed_process = run_helper(args)
 
     volume_id = completed_process.stdout.strip()
 
@@ -226,43 +440,64 @@ class MediaInfo:
     is_blank: bool
 
 
+@functools.lru_cache(maxsize=None)
 def read_media_info(device: Path) -> MediaInfo:
     args = [
         'dvd+rw-mediainfo', str(device)
     ]
-    completed_process = subprocess.run(
-        args,
-        capture_output=True, check=True, text=True
-    )
+    completed_process = run_helper(args)
 
     return parse_media_info(completed_process.stdout)
 
 
-TOTAL_SPACE_REGEX = re.compile(r'(\d+)\*')
+# Matches one `key: value` line. Lines starting with ':' are error messages
+# from dvd+rw-mediainfo and are skipped.
+MEDIA_INFO_LINE_REGEX = re.compile(
+    r'^(?P<indent> ?)(?P<key>[^:\n]+):(?P<value>[^\n]*)$',
+    re.MULTILINE
+)
 
 
 def parse_media_info(info: str) -> MediaInfo:
-    media_info_tree = build_media_info_tree(info)
-    try:
-        total_size_str, *_ = media_info_tree['READ FORMAT CAPACITIES']['00h(3000)'].split('*')  # type: ignore
-        total_size = int(total_size_str) * 2048
-    except KeyError:
-        total_size_str, *_ = media_info_tree['READ CAPACITY'].split('*')  # type: ignore
-        total_size = int(total_size_str) * 2048
-
-    is_blank = media_info_tree['READ DISC INFORMATION']['Disc status'] == 'blank'
+    format_capacity: Optional[str] = None
+    read_capacity: Optional[str] = None
+    disc_status: Optional[str] = None
+    free_blocks: Optional[str] = None
+
+    # Single pass over the output, only keeping the fields we need. Indented
+    # lines belong to the most recent unindented `section`.
+    section = ''
+    for match in MEDIA_INFO_LINE_REGEX.finditer(info):
+        indent, key, value = match.group('indent', 'key', 'value')
+        key = key.strip()
+
+        if not indent:
+            section = key
+            if key == 'READ CAPACITY':
+                read_capacity = value.strip()
+        elif section == 'READ DISC INFORMATION':
+            if key == 'Disc status':
+                disc_status = value.strip()
+        elif section == 'READ FORMAT CAPACITIES':
+            if key == '00h(3000)':
+                format_capacity = value.strip()
+        elif (key == 'Free Blocks' and disc_status != 'blank'
+              and section.startswith('READ TRACK INFORMATION')):
+            free_blocks = value.strip()  # the last track is the open one
+
+    total_size_str = format_capacity or read_capacity
+    if total_size_str is None:
+        raise ValueError('Could not find the disc capacity in media info.')
+    total_size = blocks_to_bytes(total_size_str)
+
+    is_blank = disc_status == 'blank'
 
     if is_blank:
         free_size = total_size
+    elif free_blocks is not None:
+        free_size = blocks_to_bytes(free_blocks)
     else:
-        for _, child in media_info_tree.items():
-            try:
-                free_size_str, *_ = child['Free Blocks'].split('*')
-                free_size = int(free_size_str) * 2048
-            except KeyError:
-                pass
-            except TypeError:
-                pass
+        raise ValueError('Could not find the free blocks in media info.')
 
     used_size = total_size - free_size
 
@@ -270,33 +505,10 @@ def parse_media_info(info: str) -> MediaInfo:
                      used_size=used_size, is_blank=is_blank)
 
 
-MediaInfoTree = dict[str, Union[str, dict[str, str]]]
-
-
-def build_media_info_tree(info: str) -> MediaInfoTree:
-    media_info_tree: MediaInfoTree = {}
-
-    current_child: Optional[dict[str, str]] = None
-    for line in info.split('\n'):
-        if not line.strip() or line[0] == ':':
-            pass
-        elif line[0] == ' ':
-            child_child_key, child_child_value = line.split(':')
-            current_child[child_child_key.strip()] = child_child_value.strip()  # type: ignore  # noqa
-        else:
-            child_key, child_value_str = line.split(':')
-            child_key = child_key.strip()
-            child_value: Union[str, dict[str, str]] = child_value_str.strip()
-
-            if child_value:
-                current_child = None
-            else:
-                child_value = {}
-                current_child = child_value
-
-            media_info_tree[child_key] = child_value
-
-    return media_info_tree
+def blocks_to_bytes(value: str) -> int:
+    """Convert a `<blocks>*<block size>...` value to bytes."""
+    blocks_str, *_ = value.split('*')
+    return int(blocks_str) * 2048
 
 
 
@@ -1,5 +1,12 @@
+import contextlib
 import importlib
+import io
+import os
+from pathlib import Path
+import subprocess
+import tempfile
 import unittest
+from unittest import mock
 from unittest import TestCase
 
 import disc_append
@@ -119,6 +126,228 @@ class TestReadMediaInfo(TestCase):
         media_info = disc_append.parse_media_info(BLANK_BD)
         self.assertTrue(media_info.is_blank)
 
+    def test_missing_capacity(self):
+        with self.assertRaises(ValueError):
+            disc_append.parse_media_info('INQUIRY: [HL-DT-ST]\n')
+
+
+class TestFormatSize(TestCase):
+    def test_bytes(self):
+        self.assertEqual('512 bytes', disc_append.format_size(512))
+
+    def test_binary_units(self):
+        self.assertEqual('1 KiB', disc_append.format_size(1024))
+        self.assertEqual('1.5 MiB', disc_append.format_size(1536 * 1024))
+        self.assertEqual('22.56 GiB', disc_append.format_size(24220008448))
+
+    def test_negative(self):
+        self.assertEqual('-2 GiB', disc_append.format_size(-2 * 1024 ** 3))
+
+
+class TestFingerprintSourcePaths(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.root = Path(tmp_dir.name)
+        (self.root / 'dir').mkdir()
+        (self.root / 'dir' / 'file').write_text('data')
+        self.source_paths = (self.root / 'dir',)
+
+    def test_unchanged(self):
+        self.assertEqual(
+            disc_append.fingerprint_source_paths(self.source_paths),
+            disc_append.fingerprint_source_paths(self.source_paths)
+        )
+
+    def test_file_modified(self):
+        before = disc_append.fingerprint_source_paths(self.source_paths)
+        (self.root / 'dir' / 'file').write_text('more data')
+        after = disc_append.fingerprint_source_paths(self.source_paths)
+        self.assertNotEqual(before, after)
+
+    def test_file_added(self):
+        before = disc_append.fingerprint_source_paths(self.source_paths)
+        (self.root / 'dir' / 'other').write_text('')
+        after = disc_append.fingerprint_source_paths(self.source_paths)
+        self.assertNotEqual(before, after)
+
+    def test_symlinked_source_path_followed(self):
+        (self.root / 'link').symlink_to(self.root / 'dir')
+        source_paths = (self.root / 'link',)
+        before = disc_append.fingerprint_source_paths(source_paths)
+        (self.root / 'dir' / 'other').write_text('')
+        after = disc_append.fingerprint_source_paths(source_paths)
+        self.assertNotEqual(before, after)
+
+
+class TestCache(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        patcher = mock.patch.dict(os.environ,
+                                  {'XDG_CACHE_HOME': tmp_dir.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_missing(self):
+        self.assertEqual({}, disc_append.read_cache('test.json'))
+
+    def test_round_trip(self):
+        disc_append.write_cache('test.json', {'key': 1})
+        self.assertEqual({'key': 1}, disc_append.read_cache('test.json'))
+
+    def test_oldest_entries_pruned(self):
+        cache = {str(i): i for i in range(disc_append.MAX_CACHE_ENTRIES + 5)}
+        disc_append.write_cache('test.json', cache)
+        cache = disc_append.read_cache('test.json')
+        self.assertEqual(disc_append.MAX_CACHE_ENTRIES, len(cache))
+        self.assertNotIn('0', cache)
+        self.assertIn(str(disc_append.MAX_CACHE_ENTRIES + 4), cache)
+
+
+class TestRunCaptured(TestCase):
+    def test_output(self):
+        completed_process = disc_append.run_captured(
+            ['sh', '-c', 'echo out; echo err >&2']
+        )
+        self.assertEqual('out\n', completed_process.stdout)
+        self.assertEqual('err\n', completed_process.stderr)
+
+    def test_failure(self):
+        with self.assertRaises(subprocess.CalledProcessError) as cm:
+            disc_append.run_captured(['sh', '-c', 'echo err >&2; exit 3'])
+        self.assertEqual(3, cm.exception.returncode)
+        self.assertEqual('err\n', cm.exception.stderr)
+
+
+class TestGetBytesToBeWritten(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.root = Path(tmp_dir.name)
+        patcher = mock.patch.dict(os.environ,
+                                  {'XDG_CACHE_HOME': str(self.root / 'cache')})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        (self.root / 'src').mkdir()
+        (self.root / 'src' / 'file').write_text('data')
+        self.run_config = disc_append.RunConfig(
+            command=disc_append.Command.APPEND,
+            device=Path('/dev/sr0'),
+            source_paths=(self.root / 'src',),
+            speed=1
+        )
+
+        patcher = mock.patch.object(
+            disc_append, 'run_helper',
+            return_value=subprocess.CompletedProcess([], 0, '1000\n', '')
+        )
+        self.run_helper = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cache_miss_runs_mkisofs(self):
+        size = disc_append.get_bytes_to_be_written(self.run_config)
+        self.assertEqual(1000 * 2048, size)
+        self.assertEqual(1, self.run_helper.call_count)
+
+    def test_cache_hit_skips_mkisofs(self):
+        disc_append.get_bytes_to_be_written(self.run_config)
+        size = disc_append.get_bytes_to_be_written(self.run_config)
+        self.assertEqual(1000 * 2048, size)
+        self.assertEqual(1, self.run_helper.call_count)
+
+    def test_changed_tree_runs_mkisofs(self):
+        disc_append.get_bytes_to_be_written(self.run_config)
+        (self.root / 'src' / 'file').write_text('more data')
+        disc_append.get_bytes_to_be_written(self.run_config)
+        self.assertEqual(2, self.run_helper.call_count)
+
+    def test_changed_tree_replaces_entry(self):
+        disc_append.get_bytes_to_be_written(self.run_config)
+        (self.root / 'src' / 'file').write_text('more data')
+        disc_append.get_bytes_to_be_written(self.run_config)
+        cache = disc_append.read_cache(disc_append.PRINT_SIZE_CACHE)
+        self.assertEqual(1, len(cache))
+
+    def test_unreadable_source_path(self):
+        with mock.patch.object(disc_append.os, 'scandir',
+                               side_effect=PermissionError):
+            size = disc_append.get_bytes_to_be_written(self.run_config)
+        self.assertEqual(1000 * 2048, size)
+        self.assertEqual(1, self.run_helper.call_count)
+        self.assertEqual({}, disc_append.read_cache(
+            disc_append.PRINT_SIZE_CACHE))
+
+
+class TestConfirmationFlow(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        root = Path(tmp_dir.name)
+        patcher = mock.patch.dict(os.environ,
+                                  {'XDG_CACHE_HOME': str(root / 'cache')})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.run_config = disc_append.RunConfig(
+            command=disc_append.Command.APPEND,
+            device=Path('/dev/sr0'),
+            source_paths=(root,),
+            speed=1,
+            volume_id='LABEL'
+        )
+
+        for function in (disc_append.disc_write_dry_run,
+                         disc_append.read_media_info):
+            function.cache_clear()
+            self.addCleanup(function.cache_clear)
+
+        patcher = mock.patch.object(
+            disc_append, 'run_captured',
+            return_value=subprocess.CompletedProcess([], 0, '', '')
+        )
+        self.run_captured = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = mock.patch.object(disc_append, 'run_helper',
+                                    side_effect=self.fake_run_helper)
+        self.run_helper = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        stdout = contextlib.redirect_stdout(io.StringIO())
+        stdout.__enter__()
+        self.addCleanup(stdout.__exit__, None, None, None)
+
+    @staticmethod
+    def fake_run_helper(args):
+        stdout = WRITTEN_BD if args[0] == 'dvd+rw-mediainfo' else '1000\n'
+        return subprocess.CompletedProcess(args, 0, stdout, '')
+
+    def count_helper_calls(self, command):
+        return sum(1 for call in self.run_helper.call_args_list
+                   if call.args[0][0] == command)
+
+    def test_each_tool_runs_once(self):
+        disc_append.print_confirmation_info(self.run_config)
+        disc_append.print_disc_write_error_messages(self.run_config)
+
+        self.assertEqual(1, self.run_captured.call_count)
+        self.assertEqual(1, self.count_helper_calls('dvd+rw-mediainfo'))
+        self.assertEqual(1, self.count_helper_calls('mkisofs'))
+
+    def test_media_info_reread_after_write(self):
+        with mock.patch.object(disc_append, 'parse_arguments',
+                               return_value=self.run_config), \
+                mock.patch.object(disc_append, 'ask_confirmation',
+                                  return_value=True), \
+                mock.patch.object(disc_append, 'disc_write') as disc_write, \
+                mock.patch.object(disc_append.time, 'sleep'):
+            disc_append.main()
+
+        disc_write.assert_called_once_with(self.run_config)
+        self.assertEqual(2, self.count_helper_calls('dvd+rw-mediainfo'))
+
 
 if __name__ == '__main__':
     unittest.main()